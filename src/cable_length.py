@@ -1,16 +1,113 @@
 import csv
-import math
-import re
-from clusters import expand_wiring_clusters
-from utils import hex_to_color_name
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from itertools import groupby
+from operator import itemgetter
+from typing import NamedTuple
+from rack_layout import Device
+from utils import DOT_BUFFER_SIZE, hex_to_color_name
+
+# -------------------------------------------------
+# Device info used by the length calculation
+# -------------------------------------------------
+@dataclass(slots=True)
+class DeviceInfo:
+    """
+    A device map entry together with its rack's display name and position
+    from the rack maps (see build_rack_maps), looked up once per device
+    rather than once per connection.
+    """
+    device: Device
+    rack_name: str
+    rack_index: int
+    
+    @classmethod
+    def from_device(cls, device, rack_maps):
+        """Build from a device map entry (a Device, see build_device_map)"""
+        rack_name_map, rack_index_map, _ = rack_maps
+        rack_id = device.rack_id
+        return cls(
+            device=device,
+            rack_name=rack_name_map.get(rack_id, rack_id),
+            rack_index=rack_index_map.get(rack_id, 0)
+        )
+
+# -------------------------------------------------
+# Result of the length calculation
+# -------------------------------------------------
+class CableData(NamedTuple):
+    """The breakdown of one cable's length, in metres (unit_delta is in U)"""
+    from_rack: str
+    to_rack: str
+    unit_delta: int
+    unit_length: float
+    f2b_length: float
+    inter_rack_length: float
+    cable_slack: float
+    total_length: float
+
+# -------------------------------------------------
+# Rack lookup tables
+# -------------------------------------------------
+# Lengths are worked out in whole micrometres, fine enough to hold config
+# values such as a 44.45mm U exactly
+MICROMETRES_PER_METRE = 1_000_000
+
+def build_rack_maps(rack_configs, config):
+    """
+    Build the rack lookup tables used by cable_length_between():
+    
+    - rack_name_map: rack id -> display name
+    - rack_index_map: rack id -> position of the rack in the row (0-based)
+    - inter_rack_lengths: [from_index][to_index] -> distance between two racks in micrometres
+    
+    These only depend on the rack configuration, so build them once per pass
+    rather than once per connection.
+    """
+    inter_rack_distance = round(config.get("inter_rack_distance", 2.5) * MICROMETRES_PER_METRE)  # Default 2.5m
+    
+    rack_name_map = {}
+    rack_index_map = {}
+    for rack_index, rack_config in enumerate(rack_configs):
+        rack_id = rack_config["rack"].get("id", "rack")
+        rack_name_map[rack_id] = rack_config["rack"].get("name", rack_id)
+        rack_index_map[rack_id] = rack_index
+    
+    rack_count = len(rack_configs)
+    inter_rack_lengths = [
+        [abs(from_index - to_index) * inter_rack_distance for to_index in range(rack_count)]
+        for from_index in range(rack_count)
+    ]
+    
+    return rack_name_map, rack_index_map, inter_rack_lengths
+
+# -------------------------------------------------
+# Cable length parameters
+# -------------------------------------------------
+def build_cable_params(config):
+    """
+    Read the per-cable length settings from config, converted to whole
+    micrometres so that the arithmetic (and the 0.5m rounding) is exact.
+    
+    Returns (cable_slack, standard_u_height, front_to_back). Read these once
+    per pass rather than once per connection.
+    """
+    cable_slack = round(config.get("cable_slack_length", 0.2) * MICROMETRES_PER_METRE)  # Default 0.2m
+    standard_u_height = round(config.get("standard_u_height", 0.045) * MICROMETRES_PER_METRE)  # Default 0.045m
+    front_to_back = round(config.get("front_to_back_length", 0.5) * MICROMETRES_PER_METRE)  # Default 0.5m
+    
+    return cable_slack, standard_u_height, front_to_back
 
 # -------------------------------------------------
 # Cable length calculation
 # -------------------------------------------------
-def calculate_cable_length(from_device, to_device, all_devices, rack_configs, config):
+def cable_length_between(from_info, to_info, rack_maps, cable_params):
     """
     Calculate minimum cable length needed for a connection.
     
+    Takes the DeviceInfo of both ends, the tables returned by build_rack_maps()
+    and the settings returned by build_cable_params(). Returns a CableData.
+    
     Formula: (unit_delta * 0.045) + (front_to_back * 1 or 0) + (inter_rack * 1 or 0) + cable_slack
     
     where:
@@ -23,44 +120,17 @@ def calculate_cable_length(from_device, to_device, all_devices, rack_configs, co
     - cable_slack: configured slack length
     """
     
-    # Get device info
-    from_info = all_devices.get(from_device)
-    to_info = all_devices.get(to_device)
+    # All lengths are in whole micrometres
+    cable_slack, standard_u_height, front_to_back = cable_params
     
-    if not from_info or not to_info:
-        return None
+    from_device = from_info.device
+    to_device = to_info.device
+    from_rack = from_device.rack_id
+    to_rack = to_device.rack_id
+    from_start_u = from_device.start_u
+    to_start_u = to_device.start_u
     
-    # Get config values
-    cable_slack = config.get("cable_slack_length", 0.2)  # Default 0.2m
-    standard_u_height = config.get("standard_u_height", 0.045)  # Default 0.045m
-    front_to_back = config.get("front_to_back_length", 0.5)  # Default 0.5m
-    inter_rack_distance = config.get("inter_rack_distance", 2.5)  # Default 2.5m
-    
-    # Build rack name map
-    rack_name_map = {}
-    rack_position_map = {}
-    rack_position = 0
-    for rack_config in rack_configs:
-        rack_id = rack_config["rack"].get("id", "rack")
-        rack_name = rack_config["rack"].get("name", rack_id)
-        rack_name_map[rack_id] = rack_name
-        rack_position_map[rack_id] = rack_position
-        rack_position += 1
-    
-    from_rack = from_info.get("rack_id")
-    to_rack = to_info.get("rack_id")
-    from_side = from_info.get("side", "front")
-    to_side = to_info.get("side", "front")
-    from_start_u = from_info.get("start_u", 0)
-    to_start_u = to_info.get("start_u", 0)
-    from_units = from_info.get("units", 1)
-    to_units = to_info.get("units", 1)
-    
-    # Get rack names for display
-    from_rack_name = rack_name_map.get(from_rack, from_rack)
-    to_rack_name = rack_name_map.get(to_rack, to_rack)
-    
-    # Calculate unit distance
+    # Connections to external devices are never treated as inter-rack
     if from_rack != to_rack and from_rack != "external" and to_rack != "external":
         # Inter-rack connection
         # If devices have start_u, include U distance from device to U1 on both ends
@@ -69,54 +139,122 @@ def calculate_cable_length(from_device, to_device, all_devices, rack_configs, co
         to_u_dist = (to_start_u - 1) if to_start_u else 0
         unit_delta = from_u_dist + to_u_dist
         f2b_length = 0  # No F2B for inter-rack
+        inter_rack_length = rack_maps[2][from_info.rack_index][to_info.rack_index]
     else:
         # Intra-rack connection
         if from_start_u and to_start_u:
             # Both devices have positions - use bottom U
-            from_bottom_u = from_start_u - from_units + 1
-            to_bottom_u = to_start_u - to_units + 1
+            from_bottom_u = from_start_u - from_device.units + 1
+            to_bottom_u = to_start_u - to_device.units + 1
             unit_delta = abs(from_bottom_u - to_bottom_u)
         else:
             # One or both devices undefined - use 0 for U distance
             unit_delta = 0
         
         # Calculate front-to-back distance (only if same rack, different sides)
+        from_side = from_device.side
+        to_side = to_device.side
         f2b_length = 0
         if from_rack == to_rack and from_side != to_side and from_side != "external" and to_side != "external":
             f2b_length = front_to_back
+        inter_rack_length = 0
     
     unit_length = unit_delta * standard_u_height
     
-    # Calculate inter-rack distance
-    inter_rack_length = 0
-    if from_rack != to_rack and from_rack != "external" and to_rack != "external":
-        from_pos = rack_position_map.get(from_rack, 0)
-        to_pos = rack_position_map.get(to_rack, 0)
-        rack_delta = abs(from_pos - to_pos)
-        inter_rack_length = rack_delta * inter_rack_distance
-    
-    # Total cable length
+    # Total cable length, rounded up to the next 0.5m
+    half_metre = MICROMETRES_PER_METRE // 2
     total_length = unit_length + f2b_length + inter_rack_length + cable_slack
-    total_length = math.ceil(total_length * 2) / 2
-    
-    return {
-        "from_rack": from_rack_name,
-        "to_rack": to_rack_name,
-        "unit_delta": unit_delta,
-        "unit_length": unit_length,
-        "f2b_length": f2b_length,
-        "inter_rack_length": inter_rack_length,
-        "cable_slack": cable_slack,
-        "total_length": total_length
-    }
+    total_length = -(-total_length // half_metre) * half_metre
+    
+    # Report in metres, with rack names for display. U lengths are the delta
+    # times the configured U height in metres, exactly as the config gives it
+    return CableData(
+        from_info.rack_name,
+        to_info.rack_name,
+        unit_delta,
+        unit_delta * (standard_u_height / MICROMETRES_PER_METRE),
+        f2b_length / MICROMETRES_PER_METRE,
+        inter_rack_length / MICROMETRES_PER_METRE,
+        cable_slack / MICROMETRES_PER_METRE,
+        total_length / MICROMETRES_PER_METRE
+    )
 
 # -------------------------------------------------
-# Generate cable length HTML table
+# Price connections (shared by all cable outputs)
 # -------------------------------------------------
-def generate_cable_length_html(all_devices, racks_config, wiring_layers, config, output_file="output/cable_lengths.html"):
-    """Generate an HTML table with cable length calculations"""
+def price_connections(all_devices, racks_config, expanded_layers, config):
+    """
+    Work out the cable for every connection in a single pass, so the length
+    tables and ordering summaries don't each repeat the device lookups and
+    length calculations.
+    
+    Returns a list of (layer_name, conn, cable_data, cable_type, color_name, color_hex)
+    tuples. Connections to unknown devices are skipped. cable_type and color_hex
+    fall back to the layer cable type and edge color when the connection
+    doesn't set its own. color_name is only used for ordering, so it is left
+    as None for "included" cables.
+    """
+    priced_connections = []
+    
+    # Rack lookups and length settings are the same for every connection
+    rack_maps = build_rack_maps(racks_config, config)
+    cable_params = build_cable_params(config)
+    
+    # Pull out the fields the length calculation needs, once per device
+    device_infos = {name: DeviceInfo.from_device(info, rack_maps) for name, info in all_devices.items()}
+    
+    # The same pair of devices can be linked in several layers; the cable
+    # length only depends on the pair, so work each one out once
+    cable_cache = {}
+    
+    # Process each (already expanded) wiring layer
+    for layer_name, layer_cable_type, layer_edge_color, connections in expanded_layers:
+        # Most connections use the layer color, so name it once per layer
+        layer_color_name, _ = hex_to_color_name(layer_edge_color)
+        
+        for conn in connections:
+            from_dev = conn["from"]
+            to_dev = conn["to"]
+            device_pair = (from_dev, to_dev)
+            cable_data = cable_cache.get(device_pair)
+            
+            if cable_data is None:
+                # Get device info (only looked up once per device pair)
+                from_info = device_infos.get(from_dev)
+                to_info = device_infos.get(to_dev)
+                
+                if from_info is None or to_info is None:
+                    continue
+                
+                # Calculate cable length
+                cable_data = cable_length_between(from_info, to_info, rack_maps, cable_params)
+                cable_cache[device_pair] = cable_data
+            
+            cable_type = conn.get("cable_type", "")
+            if not cable_type:
+                cable_type = layer_cable_type
+            
+            # Get color - prefer connection color, fall back to layer color
+            if "edge_color" in conn:
+                color_hex = conn["edge_color"]
+                
+                # "included" cables are never ordered, so don't name their color
+                if cable_type.lower() == "included":
+                    color_name = None
+                else:
+                    color_name, _ = hex_to_color_name(color_hex)
+            else:
+                color_hex = layer_edge_color
+                color_name = layer_color_name
+            
+            priced_connections.append((layer_name, conn, cable_data, cable_type, color_name, color_hex))
     
-    html = """<!DOCTYPE html>
+    return priced_connections
+
+# -------------------------------------------------
+# HTML page templates
+# -------------------------------------------------
+CABLE_LENGTH_HTML_HEADER = """<!DOCTYPE html>
 <html>
 <head>
     <title>Cable Length Calculations</title>
@@ -186,283 +324,14 @@ def generate_cable_length_html(all_devices, racks_config, wiring_layers, config,
         </thead>
         <tbody>
 """
-    
-    # Process each wiring layer
-    for layer in wiring_layers:
-        layer_name = layer["name"]
-        connections_raw = layer.get("connections", [])
-        
-        # Expand connections
-        layer_cable_type = layer.get("cable_type", "")
-        connections = expand_wiring_clusters(connections_raw, layer_cable_type)
-        
-        # Output each connection
-        for conn in connections:
-            from_dev = conn["from"]
-            to_dev = conn["to"]
-            
-            # Get device info
-            from_info = all_devices.get(from_dev)
-            to_info = all_devices.get(to_dev)
-            
-            if not from_info or not to_info:
-                continue
-            
-            # Calculate cable length
-            cable_data = calculate_cable_length(from_dev, to_dev, all_devices, racks_config, config)
-            
-            if cable_data:
-                cable_type = conn.get("cable_type", "")
-                html += f"""            <tr>
-                <td class="network">{layer_name}</td>
-                <td>{from_dev}</td>
-                <td>{to_dev}</td>
-                <td>{cable_type}</td>
-                <td>{cable_data['from_rack']}</td>
-                <td>{cable_data['to_rack']}</td>
-                <td class="metric">{cable_data['unit_delta']}</td>
-                <td class="metric">{cable_data['unit_length']:.3f}</td>
-                <td class="metric">{cable_data['f2b_length']:.3f}</td>
-                <td class="metric">{cable_data['inter_rack_length']:.1f}</td>
-                <td class="metric">{cable_data['cable_slack']:.3f}</td>
-                <td class="metric total">{cable_data['total_length']:.2f}</td>
-            </tr>
-"""
-    
-    html += """        </tbody>
+
+CABLE_LENGTH_HTML_FOOTER = """        </tbody>
     </table>
 </body>
 </html>
 """
-    
-    with open(output_file, 'w') as f:
-        f.write(html)
-    
-    print(f"Generated cable length HTML: {output_file}")
 
-# -------------------------------------------------
-# Generate cable length table
-# -------------------------------------------------
-def generate_cable_length_table(all_devices, racks_config, wiring_layers, config, output_file="output/cable_lengths.csv"):
-    """Generate a table with cable length calculations for all connections"""
-    
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        
-        # Header
-        writer.writerow([
-            "Network",
-            "From",
-            "To",
-            "Cable Type",
-            "From Rack",
-            "To Rack",
-            "U Distance (units)",
-            "Unit Length (m)",
-            "F2B Length (m)",
-            "Inter-rack Length (m)",
-            "Cable Slack (m)",
-            "Min Cable Length (m)"
-        ])
-        
-        # Process each wiring layer
-        for layer in wiring_layers:
-            layer_name = layer["name"]
-            connections_raw = layer.get("connections", [])
-            
-            # Expand connections
-            layer_cable_type = layer.get("cable_type", "")
-            connections = expand_wiring_clusters(connections_raw, layer_cable_type)
-            
-            # Output each connection
-            for conn in connections:
-                from_dev = conn["from"]
-                to_dev = conn["to"]
-                
-                # Get device info
-                from_info = all_devices.get(from_dev)
-                to_info = all_devices.get(to_dev)
-                
-                if not from_info or not to_info:
-                    continue
-                
-                # Calculate cable length
-                cable_data = calculate_cable_length(from_dev, to_dev, all_devices, racks_config, config)
-                
-                if cable_data:
-                    cable_type = conn.get("cable_type", "")
-                    writer.writerow([
-                        layer_name,
-                        from_dev,
-                        to_dev,
-                        cable_type,
-                        cable_data["from_rack"],
-                        cable_data["to_rack"],
-                        cable_data["unit_delta"],
-                        f"{cable_data['unit_length']:.3f}",
-                        f"{cable_data['f2b_length']:.3f}",
-                        f"{cable_data['inter_rack_length']:.1f}",
-                        f"{cable_data['cable_slack']:.3f}",
-                        f"{cable_data['total_length']:.2f}"
-                    ])
-    
-    print(f"Generated cable length table: {output_file}")
-
-# -------------------------------------------------
-# Generate cable summary (for ordering)
-# -------------------------------------------------
-def generate_cable_summary_csv(all_devices, racks_config, wiring_layers, config, output_file="output/cable_summary.csv"):
-    """
-    Generate a summary of cables needed for ordering.
-    Groups cables by type and rounded length, showing quantities for each length.
-    """
-    
-    # Structure: {(cable_type, color_name): {length: quantity, ...}, ...}
-    cable_summary = {}
-    
-    # Process each wiring layer
-    for layer in wiring_layers:
-        connections_raw = layer.get("connections", [])
-        
-        # Expand connections
-        layer_cable_type = layer.get("cable_type", "")
-        connections = expand_wiring_clusters(connections_raw, layer_cable_type)
-        
-        # Accumulate cable data
-        for conn in connections:
-            from_dev = conn["from"]
-            to_dev = conn["to"]
-            
-            # Get device info
-            from_info = all_devices.get(from_dev)
-            to_info = all_devices.get(to_dev)
-            
-            if not from_info or not to_info:
-                continue
-            
-            # Calculate cable length
-            cable_data = calculate_cable_length(from_dev, to_dev, all_devices, racks_config, config)
-            
-            if cable_data:
-                cable_type = conn.get("cable_type", "")
-                if not cable_type:
-                    cable_type = layer_cable_type
-                
-                # Skip "included" cables - they don't need ordering
-                if cable_type.lower() == "included":
-                    continue
-                
-                # Get color - prefer connection color, fall back to layer color
-                cable_color = conn.get("edge_color", layer.get("edge_color", "323232"))
-                color_name, _ = hex_to_color_name(cable_color)
-                # color_name = cable_color  # Use hex code directly
-                
-                cable_length = cable_data["total_length"]
-                
-                # Initialize cable type + color if needed
-                cable_key = (cable_type, color_name)
-                if cable_key not in cable_summary:
-                    cable_summary[cable_key] = {}
-                
-                # Increment quantity for this length
-                if cable_length not in cable_summary[cable_key]:
-                    cable_summary[cable_key][cable_length] = 0
-                cable_summary[cable_key][cable_length] += 1
-    
-    # Write CSV
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.writer(f)
-        
-        # Header
-        writer.writerow([
-            "Cable Type",
-            "Color",
-            "Length (m)",
-            "Quantity",
-            "Total Length (m)"
-        ])
-        
-        # Sort by cable type and color for consistent output
-        for cable_type, color_name in sorted(cable_summary.keys()):
-            lengths = cable_summary[(cable_type, color_name)]
-            
-            # Sort lengths in ascending order
-            for length in sorted(lengths.keys()):
-                quantity = lengths[length]
-                total_length = length * quantity
-                
-                writer.writerow([
-                    cable_type,
-                    color_name,
-                    f"{length:.1f}",
-                    quantity,
-                    f"{total_length:.1f}"
-                ])
-    
-    print(f"Generated cable summary CSV: {output_file}")
-    return cable_summary
-
-# -------------------------------------------------
-# Generate cable summary HTML
-# -------------------------------------------------
-def generate_cable_summary_html(all_devices, racks_config, wiring_layers, config, output_file="output/cable_summary.html"):
-    """Generate an HTML page with cable summary for ordering, grouped by cable type and color"""
-    
-    # Structure: {(cable_type, color_name): {length: quantity, ...}, ...}
-    cable_summary = {}
-    
-    # Process each wiring layer
-    for layer in wiring_layers:
-        connections_raw = layer.get("connections", [])
-        
-        # Expand connections
-        layer_cable_type = layer.get("cable_type", "")
-        connections = expand_wiring_clusters(connections_raw, layer_cable_type)
-        
-        # Accumulate cable data
-        for conn in connections:
-            from_dev = conn["from"]
-            to_dev = conn["to"]
-            
-            # Get device info
-            from_info = all_devices.get(from_dev)
-            to_info = all_devices.get(to_dev)
-            
-            if not from_info or not to_info:
-                continue
-            
-            # Calculate cable length
-            cable_data = calculate_cable_length(from_dev, to_dev, all_devices, racks_config, config)
-            
-            if cable_data:
-                cable_type = conn.get("cable_type", "")
-                if not cable_type:
-                    cable_type = layer_cable_type
-                
-                # Skip "included" cables - they don't need ordering
-                if cable_type.lower() == "included":
-                    continue
-                
-                # Get color - prefer connection color, fall back to layer color
-                cable_color = conn.get("edge_color", layer.get("edge_color", "#323232"))
-                color_name, _ = hex_to_color_name(cable_color)
-                # color_name = cable_color  # Use hex code directly
-                
-                cable_length = cable_data["total_length"]
-                
-                # Initialize cable type + color if needed
-                # Store both color name and hex code
-                cable_key = (cable_type, color_name, cable_color)
-                if cable_key not in cable_summary:
-                    cable_summary[cable_key] = {}
-                
-                # Increment quantity for this length
-                if cable_length not in cable_summary[cable_key]:
-                    cable_summary[cable_key][cable_length] = 0
-                cable_summary[cable_key][cable_length] += 1
-    
-    # Generate HTML
-    html = """<!DOCTYPE html>
+CABLE_SUMMARY_HTML_HEADER = """<!DOCTYPE html>
 <html>
 <head>
     <title>Cable Ordering Summary</title>
@@ -561,42 +430,245 @@ def generate_cable_summary_html(all_devices, racks_config, wiring_layers, config
     <h1>Cable Ordering Summary</h1>
     <p>Cables grouped by type and length (rounded to nearest 0.5m)</p>
 """
+
+CABLE_SUMMARY_HTML_FOOTER = """    <div class="summary-card notes">
+        <h3>Notes for Ordering</h3>
+        <p><strong>Cable Lengths:</strong> All lengths are rounded up to the nearest 0.5m increment to match common spool options (1.0m, 1.5m, 2.0m, etc.).</p>
+        <p><strong>Ordering Tips:</strong> Use these quantities and lengths to request quotes from cable suppliers. Check with vendors for available spool sizes and bulk discounts.</p>
+        <p><strong>Extra Stock:</strong> Consider ordering 10-15% extra for contingencies, future growth, and test purposes.</p>
+        <p><strong>Cable Management:</strong> Plan cable routing and pathways before ordering. Ensure cable runs are protected and labeled during installation.</p>
+    </div>
+</body>
+</html>
+"""
+
+# -------------------------------------------------
+# Generate cable length HTML table
+# -------------------------------------------------
+# One table row per connection
+CABLE_LENGTH_ROW = (
+    '            <tr>'
+    '<td class="network">{layer_name}</td>'
+    '<td>{from_dev}</td>'
+    '<td>{to_dev}</td>'
+    '<td>{cable_type}</td>'
+    '<td>{cable.from_rack}</td>'
+    '<td>{cable.to_rack}</td>'
+    '<td class="metric">{cable.unit_delta}</td>'
+    '<td class="metric">{cable.unit_length:.3f}</td>'
+    '<td class="metric">{cable.f2b_length:.3f}</td>'
+    '<td class="metric">{cable.inter_rack_length:.1f}</td>'
+    '<td class="metric">{cable.cable_slack:.3f}</td>'
+    '<td class="metric total">{cable.total_length:.2f}</td>'
+    '</tr>\n'
+)
+
+def generate_cable_length_html(priced_connections, output_file="output/cable_lengths.html"):
+    """Generate an HTML table with cable length calculations"""
     
-    # Add cable type sections
-    total_quantity_all = 0
-    total_length_all = 0
-    
-    # Group by cable type first, then by color with hex codes
-    cable_by_type = {}
-    for (cable_type, color_name, color_hex), lengths in cable_summary.items():
-        if cable_type not in cable_by_type:
-            cable_by_type[cable_type] = {}
-        cable_by_type[cable_type][(color_name, color_hex)] = lengths
-    
-    for cable_type in sorted(cable_by_type.keys()):
-        colors = cable_by_type[cable_type]
-        type_total_quantity = 0
-        type_total_length = 0
+    # Write each row straight to the file rather than building the whole page in memory
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(CABLE_LENGTH_HTML_HEADER)
         
-        html += f"""    <div class="summary-card cable-type-section">
-        <div class="cable-type-header">{cable_type}</div>
-"""
+        # Output each connection
+        row_format = CABLE_LENGTH_ROW.format
+        for layer_name, conn, cable_data, _, _, _ in priced_connections:
+            f.write(row_format(
+                layer_name=layer_name,
+                from_dev=conn["from"],
+                to_dev=conn["to"],
+                cable_type=conn.get("cable_type", ""),
+                cable=cable_data
+            ))
+        
+        f.write(CABLE_LENGTH_HTML_FOOTER)
+    
+    print(f"Generated cable length HTML: {output_file}")
+
+# -------------------------------------------------
+# Generate cable length table
+# -------------------------------------------------
+def generate_cable_length_table(priced_connections, output_file="output/cable_lengths.csv"):
+    """Generate a table with cable length calculations for all connections"""
+    
+    with open(output_file, 'w', newline='', buffering=DOT_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
         
-        # Add subsection for each color
-        for (color_name, color_hex) in sorted(colors.keys()):
-            lengths = colors[(color_name, color_hex)]
+        def _rows():
+            # Header
+            yield [
+                "Network",
+                "From",
+                "To",
+                "Cable Type",
+                "From Rack",
+                "To Rack",
+                "U Distance (units)",
+                "Unit Length (m)",
+                "F2B Length (m)",
+                "Inter-rack Length (m)",
+                "Cable Slack (m)",
+                "Min Cable Length (m)"
+            ]
             
-            # Determine text color for contrast
-            try:
-                r = int(color_hex[1:3], 16)
-                g = int(color_hex[3:5], 16)
-                b = int(color_hex[5:7], 16)
-                brightness = (r * 299 + g * 587 + b * 114) / 1000
-                text_color = "#FFFFFF" if brightness < 128 else "#000000"
-            except:
-                text_color = "#000000"
+            # Output each connection
+            for layer_name, conn, cable_data, _, _, _ in priced_connections:
+                yield [
+                    layer_name,
+                    conn["from"],
+                    conn["to"],
+                    conn.get("cable_type", ""),
+                    cable_data.from_rack,
+                    cable_data.to_rack,
+                    cable_data.unit_delta,
+                    f"{cable_data.unit_length:.3f}",
+                    f"{cable_data.f2b_length:.3f}",
+                    f"{cable_data.inter_rack_length:.1f}",
+                    f"{cable_data.cable_slack:.3f}",
+                    f"{cable_data.total_length:.2f}"
+                ]
+        
+        writer.writerows(_rows())
+    
+    print(f"Generated cable length table: {output_file}")
+
+# -------------------------------------------------
+# Build cable summary (for ordering)
+# -------------------------------------------------
+def build_cable_summary(priced_connections):
+    """
+    Count the cables needed for ordering, by type, color and rounded length.
+    Shared by the CSV and HTML summaries so the counting is only done once.
+    
+    Lengths are counted as whole half-metres (e.g. 3 for 1.5m), which hash
+    cheaply and can't split a bucket on float noise.
+    
+    Returns {(cable_type, color_name, color_hex): {half_metres: quantity, ...}, ...}
+    """
+    cable_summary = defaultdict(Counter)
+    
+    # Accumulate cable data
+    for _, _, cable_data, cable_type, color_name, color_hex in priced_connections:
+        # Skip "included" cables - they don't need ordering
+        if cable_type.lower() == "included":
+            continue
+        
+        # Lengths are already rounded to 0.5m
+        half_metres = round(cable_data.total_length * 2)
+        
+        # Increment quantity for this cable type + color and length
+        # Store both color name and hex code
+        cable_summary[(cable_type, color_name, color_hex)][half_metres] += 1
+    
+    return cable_summary
+
+# -------------------------------------------------
+# Generate cable summary (for ordering)
+# -------------------------------------------------
+def generate_cable_summary_csv(cable_summary, output_file="output/cable_summary.csv"):
+    """
+    Generate a summary of cables needed for ordering.
+    Groups cables by type and rounded length, showing quantities for each length.
+    
+    Takes the summary returned by build_cable_summary(). Colors with the same
+    name are listed together.
+    
+    Returns {(cable_type, color_name): {length_m: quantity, ...}, ...}
+    """
+    
+    # Structure: {(cable_type, color_name): {half_metres: quantity, ...}, ...}
+    summary_by_name = defaultdict(Counter)
+    for (cable_type, color_name, _), lengths in cable_summary.items():
+        summary_by_name[(cable_type, color_name)].update(lengths)
+    
+    # Sort by cable type, color and length (ascending) for consistent output
+    summary_rows = sorted(
+        (cable_type, color_name, half_metres / 2, quantity)
+        for (cable_type, color_name), lengths in summary_by_name.items()
+        for half_metres, quantity in lengths.items()
+    )
+    
+    # Write CSV
+    with open(output_file, 'w', newline='', buffering=DOT_BUFFER_SIZE) as f:
+        writer = csv.writer(f)
+        
+        def _rows():
+            # Header
+            yield [
+                "Cable Type",
+                "Color",
+                "Length (m)",
+                "Quantity",
+                "Total Length (m)"
+            ]
+            
+            for cable_type, color_name, length, quantity in summary_rows:
+                total_length = length * quantity
+                
+                yield [
+                    cable_type,
+                    color_name,
+                    f"{length:.1f}",
+                    quantity,
+                    f"{total_length:.1f}"
+                ]
+        
+        writer.writerows(_rows())
+    
+    print(f"Generated cable summary CSV: {output_file}")
+    
+    # Lengths were counted in half-metres; hand them back in metres
+    return {
+        key: {half_metres / 2: quantity for half_metres, quantity in lengths.items()}
+        for key, lengths in summary_by_name.items()
+    }
+
+# -------------------------------------------------
+# Generate cable summary HTML
+# -------------------------------------------------
+def generate_cable_summary_html(cable_summary, output_file="output/cable_summary.html"):
+    """
+    Generate an HTML page with cable summary for ordering, grouped by cable type and color.
+    Takes the summary returned by build_cable_summary().
+    """
+    
+    # Sort by cable type, then color (with hex codes), then length, in one go.
+    # Each section below is then a consecutive run of rows.
+    summary_rows = sorted(
+        (cable_type, color_name, color_hex, half_metres / 2, quantity)
+        for (cable_type, color_name, color_hex), lengths in cable_summary.items()
+        for half_metres, quantity in lengths.items()
+    )
+    
+    # Generate HTML, writing each section straight to the file
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(CABLE_SUMMARY_HTML_HEADER)
+        
+        # Add cable type sections
+        total_quantity_all = 0
+        total_length_all = 0
+        
+        for cable_type, type_rows in groupby(summary_rows, key=itemgetter(0)):
+            type_total_quantity = 0
+            type_total_length = 0
+            
+            f.write(f"""    <div class="summary-card cable-type-section">
+        <div class="cable-type-header">{cable_type}</div>
+""")
             
-            html += f"""        <div style="margin-top: 15px; padding: 10px; background-color: #f5f5f5; border-left: 4px solid {color_hex};">
+            # Add subsection for each color
+            for (color_name, color_hex), color_rows in groupby(type_rows, key=itemgetter(1, 2)):
+                # Determine text color for contrast
+                try:
+                    r = int(color_hex[1:3], 16)
+                    g = int(color_hex[3:5], 16)
+                    b = int(color_hex[5:7], 16)
+                    brightness = (r * 299 + g * 587 + b * 114) / 1000
+                    text_color = "#FFFFFF" if brightness < 128 else "#000000"
+                except:
+                    text_color = "#000000"
+                
+                f.write(f"""        <div style="margin-top: 15px; padding: 10px; background-color: #f5f5f5; border-left: 4px solid {color_hex};">
             <div style="display: flex; align-items: center; gap: 10px; margin-bottom: 10px;">
                 <div style="width: 30px; height: 30px; background-color: {color_hex}; border: 2px solid #333; border-radius: 4px;"></div>
                 <strong style="font-size: 16px;">{color_name}</strong>
@@ -611,30 +683,29 @@ def generate_cable_summary_html(all_devices, racks_config, wiring_layers, config
                     </tr>
                 </thead>
                 <tbody>
-"""
-            
-            color_quantity = 0
-            color_length = 0
-            
-            # Sort lengths in ascending order
-            for length in sorted(lengths.keys()):
-                quantity = lengths[length]
-                total_length = length * quantity
-                color_quantity += quantity
-                color_length += total_length
-                type_total_quantity += quantity
-                type_total_length += total_length
-                total_quantity_all += quantity
-                total_length_all += total_length
+""")
+                
+                color_quantity = 0
+                color_length = 0
                 
-                html += f"""                    <tr>
+                # Lengths are already in ascending order
+                for _, _, _, length, quantity in color_rows:
+                    total_length = length * quantity
+                    color_quantity += quantity
+                    color_length += total_length
+                    type_total_quantity += quantity
+                    type_total_length += total_length
+                    total_quantity_all += quantity
+                    total_length_all += total_length
+                    
+                    f.write(f"""                    <tr>
                         <td style="padding: 8px;">{length:.1f}</td>
                         <td style="padding: 8px; text-align: right; font-family: monospace; font-weight: bold;">{quantity}</td>
                         <td style="padding: 8px; text-align: right; font-family: monospace; font-weight: bold;">{total_length:.1f}</td>
                     </tr>
-"""
-            
-            html += f"""                    <tr style="background-color: #e0f2f1; font-weight: bold;">
+""")
+                
+                f.write(f"""                    <tr style="background-color: #e0f2f1; font-weight: bold;">
                         <td style="padding: 8px;">{color_name} Subtotal</td>
                         <td style="padding: 8px; text-align: right; font-family: monospace;">{color_quantity}</td>
                         <td style="padding: 8px; text-align: right; font-family: monospace;">{color_length:.1f}</td>
@@ -642,16 +713,16 @@ def generate_cable_summary_html(all_devices, racks_config, wiring_layers, config
                 </tbody>
             </table>
         </div>
-"""
-        
-        html += f"""        <div style="margin-top: 10px; padding: 10px; background-color: #c8e6c9; font-weight: bold;">
+""")
+            
+            f.write(f"""        <div style="margin-top: 10px; padding: 10px; background-color: #c8e6c9; font-weight: bold;">
             {cable_type} Total: {type_total_quantity} cables, {type_total_length:.1f}m
         </div>
     </div>
-"""
-    
-    # Add grand total
-    html += f"""    <div class="summary-card">
+""")
+        
+        # Add grand total
+        f.write(f"""    <div class="summary-card">
         <table>
             <thead>
                 <tr>
@@ -670,18 +741,7 @@ def generate_cable_summary_html(all_devices, racks_config, wiring_layers, config
         </table>
     </div>
 
-    <div class="summary-card notes">
-        <h3>Notes for Ordering</h3>
-        <p><strong>Cable Lengths:</strong> All lengths are rounded up to the nearest 0.5m increment to match common spool options (1.0m, 1.5m, 2.0m, etc.).</p>
-        <p><strong>Ordering Tips:</strong> Use these quantities and lengths to request quotes from cable suppliers. Check with vendors for available spool sizes and bulk discounts.</p>
-        <p><strong>Extra Stock:</strong> Consider ordering 10-15% extra for contingencies, future growth, and test purposes.</p>
-        <p><strong>Cable Management:</strong> Plan cable routing and pathways before ordering. Ensure cable runs are protected and labeled during installation.</p>
-    </div>
-</body>
-</html>
-"""
-    
-    with open(output_file, 'w') as f:
-        f.write(html)
+""")
+        f.write(CABLE_SUMMARY_HTML_FOOTER)
     
     print(f"Generated cable summary HTML: {output_file}")
\ No newline at end of file
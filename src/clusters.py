@@ -1,9 +1,52 @@
 import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import count
+from utils import intern_string
+
+# -------------------------------------------------
+# Cluster placeholder substitution
+# -------------------------------------------------
+# {N}, {N+X} and {N-X} placeholders in cluster templates
+_N_TOKEN = re.compile(r'\{N([+-]\d+)?\}')
+
+@lru_cache(maxsize=4096)
+def _parse_template(template: str) -> tuple[tuple[str, ...], tuple[int, ...]]:
+    """
+    Split a template around its placeholders. Templates are expanded once per
+    cluster member, so each one is only parsed the first time it is seen.
+    
+    Returns (literals, offsets), where literals is the text around the
+    placeholders (one more than there are placeholders) and offsets is each
+    placeholder's offset from N.
+    """
+    literals = []
+    offsets = []
+    position = 0
+    for match in _N_TOKEN.finditer(template):
+        literals.append(template[position:match.start()])
+        offsets.append(int(match.group(1) or 0))
+        position = match.end()
+    literals.append(template[position:])
+    
+    return tuple(literals), tuple(offsets)
+
+def expand_template(template: str, n: int) -> str:
+    """Replace every {N}, {N+X} and {N-X} placeholder in template for index n"""
+    literals, offsets = _parse_template(template)
+    if not offsets:
+        return template
+    
+    parts = [literals[0]]
+    for offset, literal in zip(offsets, literals[1:]):
+        parts.append(str(n + offset))
+        parts.append(literal)
+    return "".join(parts)
 
 # -------------------------------------------------
 # Expand computer_info clusters
 # -------------------------------------------------
-def expand_computer_info_clusters(computer_info_raw):
+def expand_computer_info_clusters(computer_info_raw: list[dict]) -> list[dict]:
     """
     Expand computer_info entries with start/end ranges.
     
@@ -21,39 +64,36 @@ def expand_computer_info_clusters(computer_info_raw):
     expanded = []
     
     for entry in computer_info_raw:
+        start = entry.get("start")
+        end = entry.get("end")
+        
         # Check if this is a cluster definition
-        if "start" in entry and "end" in entry:
+        if start is not None and end is not None:
             device_template = entry.get("device_name", "Device {N}")
-            start = entry["start"]
-            end = entry["end"]
+            start = int(start)
+            end = int(end)
             part_number = entry.get("arena_part_number", "")
             ports_template = entry.get("ethernet_ports", [])
             
+            # Find the port fields with placeholders once; the other fields
+            # are the same for every device
+            port_builders = [
+                (port_template, [(key, value) for key, value in port_template.items()
+                                 if isinstance(value, str) and "{N" in value])
+                for port_template in ports_template
+            ]
+            
             # Generate individual devices
             for n in range(start, end + 1):
                 # Expand device name
-                device_name = device_template.replace("{N}", str(n))
+                device_name = expand_template(device_template, n)
                 
-                # Expand ports
-                ports = []
-                for port_template in ports_template:
-                    port = {}
-                    for key, value in port_template.items():
-                        if isinstance(value, str):
-                            # Replace {N} placeholders
-                            value = value.replace("{N}", str(n))
-                            # Replace {N+X} placeholders
-                            match = re.search(r'\{N\+(\d+)\}', value)
-                            if match:
-                                offset = int(match.group(1))
-                                value = value.replace(match.group(0), str(n + offset))
-                            # Replace {N-X} placeholders
-                            match = re.search(r'\{N-(\d+)\}', value)
-                            if match:
-                                offset = int(match.group(1))
-                                value = value.replace(match.group(0), str(n - offset))
-                        port[key] = value
-                    ports.append(port)
+                # Expand ports - replace {N}, {N+X} and {N-X} placeholders
+                # (merging keeps the template's field order)
+                ports = [
+                    port_template | {key: expand_template(value, n) for key, value in dynamic_fields}
+                    for port_template, dynamic_fields in port_builders
+                ]
                 
                 # Create expanded entry
                 expanded.append({
@@ -70,7 +110,7 @@ def expand_computer_info_clusters(computer_info_raw):
 # -------------------------------------------------
 # Expand external devices (with group support)
 # -------------------------------------------------
-def expand_external_devices(external_devices_config):
+def expand_external_devices(external_devices_config: list[dict] | None) -> dict[str, list[dict]]:
     """
     Expand external devices, handling both grouped and ungrouped formats.
     
@@ -91,28 +131,31 @@ def expand_external_devices(external_devices_config):
     Returns a dict with group names as keys and lists of expanded devices as values.
     Ungrouped devices go into "default" group.
     """
-    expanded = {}
+    expanded = defaultdict(list)
     
     if not external_devices_config:
-        return expanded
+        return {}
     
     for entry in external_devices_config:
         # Check if this is a grouped entry
         if "devices" in entry:
-            group_name = entry.get("name", "External Devices")
+            group_name = intern_string(entry.get("name", "External Devices"))
             group_devices = []
             
             # Expand devices within the group
             for dev_template in entry.get("devices", []):
-                if "start" in dev_template and "end" in dev_template:
+                start = dev_template.get("start")
+                end = dev_template.get("end")
+                
+                if start is not None and end is not None:
                     # This is a cluster definition
                     name_template = dev_template.get("name", "Device {N}")
-                    start = dev_template["start"]
-                    end = dev_template["end"]
-                    dev_type = dev_template.get("type", "")
+                    start = int(start)
+                    end = int(end)
+                    dev_type = intern_string(dev_template.get("type", ""))  # Shared by every member
                     
                     for n in range(start, end + 1):
-                        dev_name = name_template.replace("{N}", str(n))
+                        dev_name = expand_template(name_template, n)
                         group_devices.append({
                             "name": dev_name,
                             "type": dev_type
@@ -124,16 +167,19 @@ def expand_external_devices(external_devices_config):
             expanded[group_name] = group_devices
         else:
             # Ungrouped device (flat format)
-            if "start" in entry and "end" in entry:
+            start = entry.get("start")
+            end = entry.get("end")
+            
+            if start is not None and end is not None:
                 # This is a cluster definition
                 name_template = entry.get("name", "Device {N}")
-                start = entry["start"]
-                end = entry["end"]
-                dev_type = entry.get("type", "")
+                start = int(start)
+                end = int(end)
+                dev_type = intern_string(entry.get("type", ""))  # Shared by every member
                 
                 group_devices = []
                 for n in range(start, end + 1):
-                    dev_name = name_template.replace("{N}", str(n))
+                    dev_name = expand_template(name_template, n)
                     group_devices.append({
                         "name": dev_name,
                         "type": dev_type
@@ -142,16 +188,14 @@ def expand_external_devices(external_devices_config):
                 expanded["External Devices"] = group_devices
             else:
                 # Regular ungrouped device
-                if "External Devices" not in expanded:
-                    expanded["External Devices"] = []
                 expanded["External Devices"].append(entry)
     
-    return expanded
+    return dict(expanded)
 
 # -------------------------------------------------
 # Expand wiring clusters
 # -------------------------------------------------
-def expand_wiring_clusters(connections, layer_cable_type="", layer_edge_color="#333333"):
+def expand_wiring_clusters(connections: list[dict], layer_cable_type: str = "", layer_edge_color: str = "#333333") -> list[dict]:
     """
     Expand wiring connection clusters into individual connections.
     
@@ -189,6 +233,20 @@ def expand_wiring_clusters(connections, layer_cable_type="", layer_edge_color="#
         width = conn.get("width", "")
         cable_type = conn.get("cable_type", layer_cable_type)  # Use connection cable_type or fallback to layer
         
+        # Optional fields, if present, are the same for every expanded connection
+        optional = {
+            key: value
+            for key, value in (
+                ("label", label),
+                ("color", color),
+                ("edge_color", edge_color),
+                ("style", style),
+                ("width", width),
+                ("cable_type", cable_type)
+            )
+            if value
+        }
+        
         # Normalize to_field to always be a list
         if isinstance(to_field, str):
             to_list = [to_field]
@@ -198,89 +256,56 @@ def expand_wiring_clusters(connections, layer_cable_type="", layer_edge_color="#
             to_list = [to_field]
         
         # Check if this is a cluster definition (with start/end)
-        if "start" in conn and "end" in conn:
-            start = int(conn["start"]) if isinstance(conn["start"], str) else conn["start"]
-            end = int(conn["end"]) if isinstance(conn["end"], str) else conn["end"]
+        start = conn.get("start")
+        end = conn.get("end")
+        if start is not None and end is not None:
+            start = int(start)
+            end = int(end)
+            
+            # The 'from' side is the same for every 'to' template, so expand it once
+            cluster_range = range(start, end + 1)
+            from_devs = [expand_template(from_template, n) for n in cluster_range]
             
             # Expand each 'to' template with the cluster range
             for to_template in to_list:
-                for n in range(start, end + 1):
-                    # Replace {N} placeholders
-                    from_dev = from_template.replace("{N}", str(n))
-                    to_dev = to_template.replace("{N}", str(n))
-                    
-                    # Replace {N+X} placeholders
-                    match = re.search(r'\{N\+(\d+)\}', from_dev)
-                    if match:
-                        offset = int(match.group(1))
-                        from_dev = from_dev.replace(match.group(0), str(n + offset))
-                    
-                    match = re.search(r'\{N\+(\d+)\}', to_dev)
-                    if match:
-                        offset = int(match.group(1))
-                        to_dev = to_dev.replace(match.group(0), str(n + offset))
-                    
-                    # Replace {N-X} placeholders
-                    match = re.search(r'\{N-(\d+)\}', from_dev)
-                    if match:
-                        offset = int(match.group(1))
-                        from_dev = from_dev.replace(match.group(0), str(n - offset))
-                    
-                    match = re.search(r'\{N-(\d+)\}', to_dev)
-                    if match:
-                        offset = int(match.group(1))
-                        to_dev = to_dev.replace(match.group(0), str(n - offset))
+                for n, from_dev in zip(cluster_range, from_devs):
+                    # Replace {N}, {N+X} and {N-X} placeholders
+                    to_dev = expand_template(to_template, n)
                     
                     # Create expanded connection
-                    expanded_conn = {
-                        "from": from_dev,
-                        "to": to_dev
-                    }
-                    
-                    # Add optional fields if present
-                    if label:
-                        expanded_conn["label"] = label
-                    if color:
-                        expanded_conn["color"] = color
-                    if edge_color:
-                        expanded_conn["edge_color"] = edge_color
-                    if style:
-                        expanded_conn["style"] = style
-                    if width:
-                        expanded_conn["width"] = width
-                    if cable_type:
-                        expanded_conn["cable_type"] = cable_type
-                    expanded.append(expanded_conn)
+                    expanded.append({"from": from_dev, "to": to_dev, **optional})
         else:
             # No cluster - just handle multiple 'to' targets
             for to_template in to_list:
-                expanded_conn = {
-                    "from": from_template,
-                    "to": to_template
-                }
-                
-                # Add optional fields if present
-                if label:
-                    expanded_conn["label"] = label
-                if color:
-                    expanded_conn["color"] = color
-                if edge_color:
-                    expanded_conn["edge_color"] = edge_color
-                if style:
-                    expanded_conn["style"] = style
-                if width:
-                    expanded_conn["width"] = width
-                if cable_type:
-                    expanded_conn["cable_type"] = cable_type
-                
-                expanded.append(expanded_conn)
+                expanded.append({"from": from_template, "to": to_template, **optional})
     
     return expanded
 
+# -------------------------------------------------
+# Expand all wiring layers
+# -------------------------------------------------
+def expand_wiring_layers(wiring_layers: list[dict]) -> list[tuple[str, str, str, list[dict]]]:
+    """
+    Expand the connections of every wiring layer once, so that callers
+    walking the same layers several times don't repeat the cluster expansion.
+    
+    Returns a list of (layer_name, layer_cable_type, layer_edge_color, connections)
+    tuples, one per layer, in the order the layers are defined.
+    """
+    expanded_layers = []
+    
+    for layer in wiring_layers:
+        layer_cable_type = layer.get("cable_type", "")
+        layer_edge_color = layer.get("edge_color", "#323232")
+        connections = expand_wiring_clusters(layer.get("connections", []), layer_cable_type)
+        expanded_layers.append((layer["name"], layer_cable_type, layer_edge_color, connections))
+    
+    return expanded_layers
+
 # -------------------------------------------------
 # Expand cluster definitions
 # -------------------------------------------------
-def expand_clusters(devices):
+def expand_clusters(devices: list[dict]) -> list[dict]:
     """
     Expand cluster device definitions into individual devices.
     
@@ -302,30 +327,29 @@ def expand_clusters(devices):
     
     for dev in devices:
         # Check if this is a cluster definition
-        if "start" in dev and "end" in dev and "{N}" in dev.get("name", ""):
+        if "start" in dev and "end" in dev and _N_TOKEN.search(dev.get("name", "")):
             start_num = dev["start"]
             end_num = dev["end"]
             start_u = dev["start_u"]
             units = dev["units"]
             spacing = dev.get("spacing", 0)
             
+            name_template = dev["name"]
+            
+            # Fields shared by every member (cluster-specific fields removed)
+            member_template = {key: value for key, value in dev.items()
+                               if key not in ("start", "end", "spacing")}
+            
+            # Each item sits (units + spacing) below the one before it
+            u_positions = count(start_u, -(units + spacing))
+            
             # Expand the cluster
-            for i in range(start_num, end_num + 1):
-                # Calculate U position for this item
-                items_before = i - start_num
-                u_offset = (units + spacing) * items_before
-                current_start_u = start_u - u_offset
-                
+            for i, current_start_u in zip(range(start_num, end_num + 1), u_positions):
                 # Create expanded device
-                expanded_dev = dev.copy()
-                expanded_dev["name"] = dev["name"].replace("{N}", str(i))
-                expanded_dev["start_u"] = current_start_u
-                
-                # Remove cluster-specific fields
-                for key in ["start", "end", "spacing"]:
-                    expanded_dev.pop(key, None)
-                
-                expanded.append(expanded_dev)
+                expanded.append(member_template | {
+                    "name": expand_template(name_template, i),
+                    "start_u": current_start_u
+                })
         else:
             # Regular device, add as-is
             expanded.append(dev)
@@ -1,6 +1,12 @@
 import csv
 import json
 
+# orjson is optional - it's only used to speed up the JSON export
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # -------------------------------------------------
 # Export computer_info to CSV
 # -------------------------------------------------
@@ -44,18 +50,36 @@ def export_computer_info_csv(computer_info, output_file="output/computer_info.cs
 # Export computer_info to JSON
 # -------------------------------------------------
 def export_computer_info_json(computer_info, output_file="output/computer_info.json"):
-    """Export computer_info to JSON format"""
-    with open(output_file, 'w') as f:
-        json.dump(computer_info, f, indent=2)
+    """Export computer_info to JSON format (using orjson if it is installed)"""
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(computer_info, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(computer_info, f, indent=2, ensure_ascii=False)
     
     print(f"Exported computer_info to {output_file}")
 
 # -------------------------------------------------
 # Export computer_info to HTML
 # -------------------------------------------------
+# One table row per port
+COMPUTER_INFO_ROW = (
+    '            <tr>'
+    '<td class="device-name">{0}</td>'
+    '<td>{1}</td>'
+    '<td class="port-number">{2}</td>'
+    '<td>{3}</td>'
+    '<td class="mac-address">{4}</td>'
+    '<td class="ip-address">{5}</td>'
+    '</tr>\n'
+)
+
 def export_computer_info_html(computer_info, output_file="output/computer_info.html"):
     """Export computer_info to HTML table"""
-    html = """<!DOCTYPE html>
+    
+    # Collect the page in pieces and join once at the end
+    parts = ["""<!DOCTYPE html>
 <html>
 <head>
     <title>Computer Info</title>
@@ -122,42 +146,38 @@ def export_computer_info_html(computer_info, output_file="output/computer_info.h
             </tr>
         </thead>
         <tbody>
-"""
+"""]
     
-    for device in computer_info:
-        device_name = device.get("device_name", "")
-        part_number = device.get("arena_part_number", "")
-        ports = device.get("ethernet_ports", [])
-        
-        if not ports:
-            html += f"""            <tr>
-                <td class="device-name">{device_name}</td>
-                <td>{part_number}</td>
-                <td class="port-number">-</td>
-                <td>-</td>
-                <td class="mac-address">-</td>
-                <td class="ip-address">-</td>
-            </tr>
-"""
-        else:
-            for idx, port in enumerate(ports, 1):
-                html += f"""            <tr>
-                <td class="device-name">{device_name}</td>
-                <td>{part_number}</td>
-                <td class="port-number">{idx}</td>
-                <td>{port.get('adapter', '')}</td>
-                <td class="mac-address">{port.get('mac', '')}</td>
-                <td class="ip-address">{port.get('ip', '')}</td>
-            </tr>
-"""
+    def _rows():
+        row_format = COMPUTER_INFO_ROW.format
+        for device in computer_info:
+            device_name = device.get("device_name", "")
+            part_number = device.get("arena_part_number", "")
+            ports = device.get("ethernet_ports", [])
+            
+            if not ports:
+                yield row_format(device_name, part_number, "-", "-", "-", "-")
+            else:
+                for idx, port in enumerate(ports, 1):
+                    yield row_format(
+                        device_name,
+                        part_number,
+                        idx,
+                        port.get("adapter", ""),
+                        port.get("mac", ""),
+                        port.get("ip", "")
+                    )
+    
+    # One row per port (or a single placeholder row for devices without ports)
+    parts.append("".join(_rows()))
     
-    html += """        </tbody>
+    parts.append("""        </tbody>
     </table>
 </body>
 </html>
-"""
+""")
     
-    with open(output_file, 'w') as f:
-        f.write(html)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write("".join(parts))
     
     print(f"Exported computer_info to {output_file}")
\ No newline at end of file
@@ -6,10 +6,10 @@ import re
 from collections import defaultdict
 from math import sqrt
 
-from utils import load_config, get_device_color
+from utils import DOT_BUFFER_SIZE, load_config, get_device_color
 from wiring_diagram import generate_wiring_diagram
-from cable_length import generate_cable_length_table, generate_cable_length_html, generate_cable_summary_csv, generate_cable_summary_html
-from clusters import expand_computer_info_clusters, expand_external_devices, expand_clusters, expand_wiring_clusters
+from cable_length import generate_cable_length_table, generate_cable_length_html, generate_cable_summary_csv, generate_cable_summary_html, price_connections, build_cable_summary
+from clusters import expand_computer_info_clusters, expand_wiring_clusters, expand_wiring_layers
 from rack_layout import generate_rack_layout_dot, build_device_map, build_occupancy
 from computer_info import export_computer_info_csv, export_computer_info_json, export_computer_info_html
 
@@ -39,60 +39,45 @@ def main():
         racks_config = config["racks"]
         external_devices_config = config.get("external_devices", [])
         
+        # Build device map for wiring (from both front and rear + external)
         all_devices = build_device_map(racks_config, external_devices_config)
         
         # Generate single comprehensive layout
-        layout_dot = generate_rack_layout_dot(racks_config, type_colors)
-        with open("output/rack_layout.dot", "w") as f:
-            f.write(layout_dot)
+        with open("output/rack_layout.dot", "w", encoding="utf-8", newline="\n", buffering=DOT_BUFFER_SIZE) as f:
+            generate_rack_layout_dot(racks_config, type_colors, out=f)
         print("Generated output/rack_layout.dot")
         
-        # Build device map for wiring (from both front and rear + external)
-        all_devices = {}
-        
-        # Add rack devices
-        for rack_config in racks_config:
-            rack_id = rack_config["rack"].get("id", "rack")
-            
-            for side in ['front', 'rear']:
-                if side in rack_config:
-                    devices = expand_clusters(rack_config[side])
-                    for dev in devices:
-                        dev["rack_id"] = rack_id
-                        dev["side"] = side
-                        all_devices[dev["name"]] = dev
-        
-        # Add external devices (organized by group)
-        if external_devices_config:
-            expanded_ext_devices = expand_external_devices(external_devices_config)
-            for group_name, devices in expanded_ext_devices.items():
-                for dev in devices:
-                    dev_copy = dev.copy()
-                    dev_copy["rack_id"] = "external"
-                    dev_copy["external_group"] = group_name
-                    all_devices[dev["name"]] = dev_copy
-        
-        external_device_count = len(all_devices) - sum(len(expand_clusters(rack_config.get(side, []))) 
-                                                        for rack_config in racks_config 
-                                                        for side in ['front', 'rear'])
+        external_device_count = sum(1 for device in all_devices.values() if device.rack_id == "external")
         print(f"Device map built with {len(all_devices)} devices ({external_device_count} external)")
 
         layers = config.get("wiring_layers", [])
-        for layer in layers:
+        
+        # Expand wiring clusters once and share them between all the outputs
+        expanded_layers = expand_wiring_layers(layers)
+        
+        # Device fill colors are the same in every layer
+        device_colors = {name: get_device_color(device.color, device.type, type_colors) for name, device in all_devices.items()}
+        
+        for layer, (_, _, _, connections) in zip(layers, expanded_layers):
             layer_name = layer["name"]
             safe_name = layer_name.replace(" ", "_").replace("/", "_").lower()
             filename = f"output/{safe_name}.dot"
             
-            wiring_dot = generate_wiring_diagram(layer, all_devices, type_colors)
-            with open(filename, "w") as f:
-                f.write(wiring_dot)
+            with open(filename, "w", encoding="utf-8", newline="\n", buffering=DOT_BUFFER_SIZE) as f:
+                generate_wiring_diagram(layer, all_devices, type_colors, connections, device_colors, out=f)
             print(f"Generated {filename}")
         
+        # Work out every cable once and share the result between the cable outputs
+        priced_connections = price_connections(all_devices, racks_config, expanded_layers, cable_config)
+        
         # Generate cable length tables
-        generate_cable_length_table(all_devices, racks_config, layers, cable_config)
-        generate_cable_length_html(all_devices, racks_config, layers, cable_config)
-        generate_cable_summary_csv(all_devices, racks_config, layers, config)
-        generate_cable_summary_html(all_devices, racks_config, layers, config)
+        generate_cable_length_table(priced_connections)
+        generate_cable_length_html(priced_connections)
+        
+        # Count cables for ordering once for both summaries
+        cable_summary = build_cable_summary(priced_connections)
+        generate_cable_summary_csv(cable_summary)
+        generate_cable_summary_html(cable_summary)
         
         # Process computer_info
         computer_info_raw = config.get("computer_info", [])
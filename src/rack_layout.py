@@ -1,12 +1,47 @@
+import io
+from dataclasses import dataclass
 from clusters import expand_clusters, expand_external_devices
-from utils import get_device_color
+from utils import get_device_color, intern_string
+
+# -------------------------------------------------
+# Device map entries
+# -------------------------------------------------
+@dataclass(slots=True, frozen=True)
+class Device:
+    """
+    One entry in the device map (see build_device_map): the config fields the
+    wiring diagrams and cable calculations read, plus where the device sits.
+    External devices have rack_id and side "external" and no position in a rack.
+    """
+    name: str
+    rack_id: str
+    side: str
+    external_group: str | None = None
+    type: str | None = None
+    color: str | None = None
+    start_u: int = 0
+    units: int = 1
+    
+    @classmethod
+    def from_config(cls, dev, rack_id, side, external_group=None):
+        """Build from an (expanded) device config entry"""
+        return cls(
+            name=dev["name"],
+            rack_id=rack_id,
+            side=side,
+            external_group=external_group,
+            type=dev.get("type"),
+            color=dev.get("color"),
+            start_u=dev.get("start_u", 0),
+            units=dev.get("units", 1)
+        )
 
 # -------------------------------------------------
 # Build device map
 # -------------------------------------------------
 def build_device_map(racks_config, external_devices_config=None):
     """
-    Build a map of device name -> {rack_id, device_info}
+    Build a map of device name -> Device
     Includes both rack devices and external devices
     
     External devices are organized in groups
@@ -15,7 +50,8 @@ def build_device_map(racks_config, external_devices_config=None):
     
     # Add rack devices
     for rack_config in racks_config:
-        rack_id = rack_config["rack"].get("id", "rack")
+        # Every device in the rack shares one copy of the rack id
+        rack_id = intern_string(rack_config["rack"].get("id", "rack"))
         
         for side in ['front', 'rear']:
             if side in rack_config:
@@ -23,10 +59,7 @@ def build_device_map(racks_config, external_devices_config=None):
                 devices = expand_clusters(rack_config[side])
                 
                 for dev in devices:
-                    dev_copy = dev.copy()
-                    dev_copy["rack_id"] = rack_id
-                    dev_copy["side"] = side
-                    all_devices[dev["name"]] = dev_copy
+                    all_devices[dev["name"]] = Device.from_config(dev, rack_id, side)
     
     # Add external devices
     if external_devices_config:
@@ -35,11 +68,7 @@ def build_device_map(racks_config, external_devices_config=None):
         # Flatten all grouped devices into the device map
         for group_name, devices in expanded_ext_devices.items():
             for dev in devices:
-                dev_copy = dev.copy()
-                dev_copy["rack_id"] = "external"
-                dev_copy["external_group"] = group_name
-                dev_copy["side"] = "external"
-                all_devices[dev["name"]] = dev_copy
+                all_devices[dev["name"]] = Device.from_config(dev, "external", "external", group_name)
     
     return all_devices
 
@@ -48,12 +77,13 @@ def build_device_map(racks_config, external_devices_config=None):
 # -------------------------------------------------
 def build_occupancy(devices, total_u):
     """
-    Build map: U number -> device
+    Build map: U number -> device, as a list indexed by U (index 0 unused,
+    None for empty slots)
     """
     # First expand clusters
     devices = expand_clusters(devices)
     
-    slots = {}
+    slots = [None] * (total_u + 1)
     for dev in devices:
         name = dev["name"]
         try:
@@ -63,12 +93,21 @@ def build_occupancy(devices, total_u):
             if units < 1:
                 raise ValueError(f"{name} has invalid unit size")
             
-            for u in range(start, start - units, -1):
-                if u < 1:
-                    raise ValueError(f"{name} exceeds bottom of rack")
-                if u in slots:
-                    raise ValueError(f"U{u} conflict between {slots[u]['name']} and {name}")
-                slots[u] = dev
+            if start > total_u:
+                raise ValueError(f"{name} exceeds top of rack")
+            
+            # Check the whole span before placing anything, so a skipped
+            # device doesn't leave some of its units behind
+            bottom = start - units + 1
+            window = slots[max(bottom, 1):max(start + 1, 1)]
+            if any(window):
+                # Report the highest conflicting U
+                u, other = next((u, other) for u, other in zip(range(start, 0, -1), reversed(window)) if other)
+                raise ValueError(f"U{u} conflict between {other['name']} and {name}")
+            if bottom < 1:
+                raise ValueError(f"{name} exceeds bottom of rack")
+            
+            slots[bottom:start + 1] = [dev] * units
         except Exception as e:
             print(f"Skipping layout for device '{name}'. {str(e)}")
     
@@ -77,28 +116,36 @@ def build_occupancy(devices, total_u):
 # -------------------------------------------------
 # DOT Generator - Multi-Rack Layout (Front + Rear Horizontal)
 # -------------------------------------------------
-def generate_rack_layout_dot(racks_config, type_colors):
+def generate_rack_layout_dot(racks_config, type_colors, out=None):
     """
     Generate a single diagram showing all racks horizontally:
     Rack 1 Front | Rack 1 Rear | Spacer | Rack 2 Front | Rack 2 Rear | Spacer | ...
+    
+    If out (a text stream) is given the DOT is written straight to it and
+    nothing is returned; otherwise the DOT is returned as a string.
     """
-    lines = []
+    buf = io.StringIO() if out is None else out
+    w = buf.write
+    
+    font_face = "\"Sinkin Sans 400 Regular\""
     
     # Graph header
-    lines.append("digraph rack_layout {")
-    lines.append("")
-    lines.append("  graph [")
-    lines.append("    rankdir=TB,")
-    lines.append("    nodesep=0.3,")
-    lines.append("    ranksep=0,")
-    lines.append("    bgcolor=\"white\"")
-    lines.append("  ];")
-    lines.append("")
-    lines.append("  node [")
-    lines.append("    shape=plain,")
-    lines.append("    fontname=\"Sinkin Sans 400 Regular\"")
-    lines.append("  ];")
-    lines.append("")
+    w(
+        "digraph rack_layout {\n"
+        "\n"
+        "  graph [\n"
+        "    rankdir=TB,\n"
+        "    nodesep=0.3,\n"
+        "    ranksep=0,\n"
+        "    bgcolor=\"white\"\n"
+        "  ];\n"
+        "\n"
+        "  node [\n"
+        "    shape=plain,\n"
+        f"    fontname={font_face}\n"
+        "  ];\n"
+        "\n"
+    )
     
     # Generate each rack (front and rear)
     for rack_config in racks_config:
@@ -114,6 +161,10 @@ def generate_rack_layout_dot(racks_config, type_colors):
         title_font = rack.get("title_font_size", 16)
         auto_scale = rack.get("auto_scale_font", True)
         
+        # Markup shared by every row of this rack's tables
+        u_cell_start = f"<TR>\n<TD WIDTH=\"{u_col_width}\"><FONT FACE={font_face}>"
+        unit_font_start = f"<BR/><FONT POINT-SIZE=\"{unit_font}\" FACE={font_face}>"
+        
         # Process both front and rear
         for side in ['front', 'rear']:
             if side not in rack_config:
@@ -123,55 +174,54 @@ def generate_rack_layout_dot(racks_config, type_colors):
             side_node_id = f"{rack_id}_{side}"
             slots = build_occupancy(devices, total_u)
             
-            # Rack node
-            lines.append(f"  {side_node_id} [")
-            lines.append("    label=<")
-            lines.append("")
-            
-            # Table start
-            lines.append("<TABLE")
-            lines.append("  BORDER=\"2\"")
-            lines.append("  CELLBORDER=\"1\"")
-            lines.append("  CELLSPACING=\"0\"")
-            lines.append("  CELLPADDING=\"4\"")
-            lines.append(f"  WIDTH=\"{table_width}\"")
-            lines.append(">")
-            lines.append("")
+            # Rack node and table start
+            w(
+                f"  {side_node_id} [\n"
+                "    label=<\n"
+                "\n"
+                "<TABLE\n"
+                "  BORDER=\"2\"\n"
+                "  CELLBORDER=\"1\"\n"
+                "  CELLSPACING=\"0\"\n"
+                "  CELLPADDING=\"4\"\n"
+                f"  WIDTH=\"{table_width}\"\n"
+                ">\n"
+                "\n"
+            )
             
             # Title row
             side_label = side.capitalize()
-            lines.append("<TR>")
-            lines.append(
+            w(
+                "<TR>\n"
                 f"<TD COLSPAN=\"3\" BGCOLOR=\"#5af282\">"
-                f"<FONT POINT-SIZE=\"{title_font}\" FACE=\"Sinkin Sans 400 Regular\">"
+                f"<FONT POINT-SIZE=\"{title_font}\" FACE={font_face}>"
                 f"<B>{rack['name']} {side_label}</B>"
-                f"</FONT></TD>"
+                "</FONT></TD>\n"
+                "</TR>\n"
             )
-            lines.append("</TR>")
             
-            processed = set()
+            processed = [False] * (total_u + 1)
             
             # Rack rows (top to bottom)
             for u in range(total_u, 0, -1):
-                if u in processed:
+                if processed[u]:
                     continue
                 
-                dev = slots.get(u)
+                dev = slots[u]
                 
                 # Empty slot
                 if not dev:
-                    lines.append("<TR>")
-                    lines.append(
-                        f"<TD WIDTH=\"{u_col_width}\"><FONT FACE=\"Sinkin Sans 400 Regular\">{u}</FONT></TD>"
+                    w(
+                        f"{u_cell_start}{u}</FONT></TD>\n"
+                        "<TD COLSPAN=\"2\"></TD>\n"
+                        "</TR>\n"
                     )
-                    lines.append("<TD COLSPAN=\"2\"></TD>")
-                    lines.append("</TR>")
                     continue
                 
                 # Device slot
                 name = dev["name"]
                 units = dev["units"]
-                color = get_device_color(dev, type_colors)
+                color = get_device_color(dev.get("color"), dev.get("type"), type_colors)
                 
                 # Auto-scale font for big devices
                 if auto_scale:
@@ -179,58 +229,54 @@ def generate_rack_layout_dot(racks_config, type_colors):
                 else:
                     device_font = base_device_font
                 
-                # First row
-                lines.append("<TR>")
-                lines.append(
-                    f"<TD WIDTH=\"{u_col_width}\"><FONT FACE=\"Sinkin Sans 400 Regular\">{u}</FONT></TD>"
-                )
-                
-                # Build device cell content
-                device_content = f"<FONT POINT-SIZE=\"{device_font}\" FACE=\"Sinkin Sans 400 Regular\"><B>{name}</B></FONT>"
-                
                 # Only add units label if device is not 1U
+                units_label = ""
                 if units > 1:
-                    device_content += f"<BR/><FONT POINT-SIZE=\"{unit_font}\" FACE=\"Sinkin Sans 400 Regular\">{units}U</FONT>"
+                    units_label = f"{unit_font_start}{units}U</FONT>"
                 
-                lines.append(
+                # First row
+                w(
+                    f"{u_cell_start}{u}</FONT></TD>\n"
                     f"<TD COLSPAN=\"2\" "
                     f"ROWSPAN=\"{units}\" "
                     f"BGCOLOR=\"{color}\" "
                     f"WIDTH=\"{device_width}\">"
-                    f"{device_content}"
-                    f"</TD>"
+                    f"<FONT POINT-SIZE=\"{device_font}\" FACE={font_face}><B>{name}</B></FONT>"
+                    f"{units_label}"
+                    "</TD>\n"
+                    "</TR>\n"
                 )
-                lines.append("</TR>")
                 
                 # Mark occupied rows
                 for i in range(units):
-                    processed.add(u - i)
+                    processed[u - i] = True
                 
                 # Remaining rows for rowspan
                 for i in range(1, units):
-                    lines.append("<TR>")
-                    lines.append(
-                        f"<TD WIDTH=\"{u_col_width}\"><FONT FACE=\"Sinkin Sans 400 Regular\">{u - i}</FONT></TD>"
+                    w(
+                        f"{u_cell_start}{u - i}</FONT></TD>\n"
+                        "</TR>\n"
                     )
-                    lines.append("</TR>")
             
             # Table end
-            lines.append("")
-            lines.append("</TABLE>")
-            lines.append("")
-            lines.append(">")
-            lines.append("  ];")
-            lines.append("")
+            w(
+                "\n"
+                "</TABLE>\n"
+                "\n"
+                ">\n"
+                "  ];\n"
+                "\n"
+            )
     
     # Create spacing nodes between rack pairs
-    lines.append("  // Spacing between rack pairs")
+    w("  // Spacing between rack pairs\n")
     for i in range(len(racks_config) - 1):
         spacer_id = f"spacer_{i}"
-        lines.append(f"  {spacer_id} [shape=point, style=invis, width=1.6, height=0, fixedsize=true];")
-    lines.append("")
+        w(f"  {spacer_id} [shape=point, style=invis, width=1.6, height=0, fixedsize=true];\n")
+    w("\n")
     
     # Create horizontal ranking: 1F, 1R, spacer, 2F, 2R, spacer, 3F, 3R, ...
-    lines.append("  // Horizontal layout with spacing")
+    w("  // Horizontal layout with spacing\n")
     rank_nodes = []
     for i in range(len(racks_config)):
         rack_id = racks_config[i]["rack"].get("id", "rack")
@@ -241,20 +287,22 @@ def generate_rack_layout_dot(racks_config, type_colors):
         if i < len(racks_config) - 1:
             rank_nodes.append(f"spacer_{i}")
     
-    lines.append(f"  {{ rank=same; {'; '.join(rank_nodes)}; }}")
-    lines.append("")
+    w(f"  {{ rank=same; {'; '.join(rank_nodes)}; }}\n")
+    w("\n")
     
     # Create invisible edges to enforce spacing between pairs
-    lines.append("  // Invisible edges to enforce spacing")
+    w("  // Invisible edges to enforce spacing\n")
     for i in range(len(racks_config) - 1):
         current_rear = f"{racks_config[i]['rack'].get('id', 'rack')}_rear"
         spacer = f"spacer_{i}"
         next_front = f"{racks_config[i+1]['rack'].get('id', 'rack')}_front"
         
-        lines.append(f"  {current_rear} -> {spacer} [style=invis, minlen=1];")
-        lines.append(f"  {spacer} -> {next_front} [style=invis, minlen=1];")
+        w(
+            f"  {current_rear} -> {spacer} [style=invis, minlen=1];\n"
+            f"  {spacer} -> {next_front} [style=invis, minlen=1];\n"
+        )
     
-    lines.append("")
-    lines.append("}")
+    w("\n}")
     
-    return "\n".join(lines)
+    if out is None:
+        return buf.getvalue()
@@ -1,5 +1,11 @@
+import re
+import sys
 import yaml
-import colorsys
+from functools import lru_cache
+
+# Output files are written through a large buffer, so the generators' many
+# small writes don't each hit the file
+DOT_BUFFER_SIZE = 1024 * 1024
 
 # -------------------------------------------------
 # Load config
@@ -11,96 +17,118 @@ def load_config():
 # -------------------------------------------------
 # Get device color based on type or explicit color
 # -------------------------------------------------
-def get_device_color(device, type_colors):
+def get_device_color(color, device_type, type_colors):
     """
-    Determine device color with priority:
+    Determine device color from its 'color' and 'type' (either may be None)
+    with priority:
     1. Explicit 'color' attribute in device
     2. Color based on device 'type' from type_colors mapping
     3. Default white if neither specified
     """
-    if "color" in device:
-        return device["color"]
+    if color is not None:
+        return color
     
-    if "type" in device:
-        device_type = device["type"]
-        if device_type in type_colors:
-            return type_colors[device_type]
+    if device_type is not None and device_type in type_colors:
+        return type_colors[device_type]
     
-    result = "#FFFFFF"
+    return "#FFFFFF"
+
+# -------------------------------------------------
+# Intern repeated config strings
+# -------------------------------------------------
+def intern_string(value):
+    """
+    Intern a string that is stored on many devices (rack ids, group names,
+    device types) so they all share one object. Non-strings (e.g. a numeric
+    rack id in the YAML) are returned unchanged.
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
 
 # -------------------------------------------------
 # Color utilities
 # -------------------------------------------------
+_HEX_DIGITS = re.compile(r'[0-9A-Fa-f]*')
 
+@lru_cache(maxsize=None)
 def hex_to_color_name(hex_color):
     """
     Convert hex color code to a human-friendly color name
     using HSV color space (closer to human perception).
+    
+    Always returns (name, hex): hex is the normalised "#RRGGBB" code, or the
+    value as given if it is already a color name (e.g. "red" -> ("Red", "red")).
+    Empty or malformed codes are named "Unknown".
+    
+    Results are cached, since a project only uses a handful of distinct colors.
     """
 
     if not hex_color:
         return "Unknown", "#FFFFFF"
 
-    result = None    
-
+    color = hex_color
     hex_color = hex_color.lstrip("#")
 
     # Already a name
-    if not all(c in "0123456789ABCDEFabcdef" for c in hex_color):
-        return hex_color.capitalize()
+    if not _HEX_DIGITS.fullmatch(hex_color):
+        return hex_color.capitalize(), color
 
     # Expand shorthand
     if len(hex_color) == 3:
         hex_color = "".join(c * 2 for c in hex_color)
 
     if len(hex_color) != 6:
-        result = "Unknown"
-
-    try:
-        r = int(hex_color[0:2], 16)
-        g = int(hex_color[2:4], 16)
-        b = int(hex_color[4:6], 16)
-    except ValueError:
-        result = "Unknown"
-
-    # Normalize to 0–1
-    r, g, b = r / 255, g / 255, b / 255
+        return "Unknown", f"#{hex_color.upper()}"
 
-    # Convert to HSV
-    h, s, v = colorsys.rgb_to_hsv(r, g, b)
+    r, g, b = bytes.fromhex(hex_color)
 
-    h = h * 360  # degrees
+    # HSV in integer arithmetic: value is the max channel (0-255),
+    # saturation is delta / value and the hue (degrees) is scaled by delta
+    value = max(r, g, b)
+    delta = value - min(r, g, b)
 
-    # Grayscale detection
-    if s < 0.25:
-        if v < 0.2:
-            result = "Black"
-        elif v > 0.9:
-            result = "White"
+    # Grayscale detection (saturation < 0.25)
+    if not delta or delta * 4 < value:
+        if value < 51:  # v < 0.2
+            name = "Black"
+        elif value >= 230:  # v > 0.9
+            name = "White"
         else:
-            result = "Grey"
-
-    if not result:
-        # Color classification by hue
-        if h < 15 or h >= 345:
-            result = "Red"
-        elif h < 45:
-            result = "Orange"
-        elif h < 65:
-            result = "Yellow"
-        elif h < 150:
-            result = "Green"
-        elif h < 200:
-            result = "Cyan"
-        elif h < 260:
-            result = "Blue"
-        elif h < 290:
-            result = "Purple"
-        elif h < 330:
-            result = "Magenta"
-        else:
-            result = "Red"
-
-    return result, f"#{hex_color.upper()}"
-
-print(hex_to_color_name("#323232"))
\ No newline at end of file
+            name = "Grey"
+        return name, f"#{hex_color.upper()}"
+
+    if value == r:
+        hue = 60 * (g - b)
+        if hue < 0:
+            hue += 360 * delta
+    elif value == g:
+        hue = 60 * (b - r) + 120 * delta
+    else:
+        hue = 60 * (r - g) + 240 * delta
+
+    # Color classification by hue
+    if hue < 15 * delta or hue >= 345 * delta:
+        name = "Red"
+    elif hue < 45 * delta:
+        name = "Orange"
+    elif hue < 65 * delta:
+        name = "Yellow"
+    elif hue < 150 * delta:
+        name = "Green"
+    elif hue < 200 * delta:
+        name = "Cyan"
+    elif hue < 260 * delta:
+        name = "Blue"
+    elif hue < 290 * delta:
+        name = "Purple"
+    elif hue < 330 * delta:
+        name = "Magenta"
+    else:
+        name = "Red"
+
+    return name, f"#{hex_color.upper()}"
+
+
+if __name__ == "__main__":
+    print(hex_to_color_name("#323232"))
\ No newline at end of file
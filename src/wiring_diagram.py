@@ -1,15 +1,27 @@
+import io
 import math
-from collections import defaultdict
-from utils import get_device_color
+from collections import Counter, defaultdict
 from clusters import expand_wiring_clusters
+from utils import get_device_color
+
+# Characters that can't appear in a bare DOT node id
+_NID_TABLE = str.maketrans({" ": "_", "/": "_"})
 
 # -------------------------------------------------
 # Generate Wiring Diagram with Radial Layout
 # -------------------------------------------------
-def generate_wiring_diagram(layer, all_devices, type_colors):
+def generate_wiring_diagram(layer, all_devices, type_colors, connections=None, device_colors=None, out=None):
     """
     Generate a radial wiring diagram grouped by rack.
     
+    connections can be passed in if the layer's clusters have already been
+    expanded (see expand_wiring_layers); otherwise they are expanded here.
+    Likewise device_colors (device name -> fill color) can be shared between
+    layers; otherwise it is worked out from type_colors here.
+    
+    If out (a text stream) is given the DOT is written straight to it and
+    nothing is returned; otherwise the DOT is returned as a string.
+    
     Structure:
     - Connections are organized by rack
     - Each rack has central hubs (devices with >1 connection) with peripheral devices in a circle
@@ -28,44 +40,52 @@ def generate_wiring_diagram(layer, all_devices, type_colors):
     font_size = layer.get("font_size", 11)
     
     # Expand connection clusters with layer defaults
-    connections = expand_wiring_clusters(connections_raw, layer_cable_type, layer_edge_color)
+    if connections is None:
+        connections = expand_wiring_clusters(connections_raw, layer_cable_type, layer_edge_color)
     
-    lines = []
+    if device_colors is None:
+        device_colors = {name: get_device_color(device.color, device.type, type_colors) for name, device in all_devices.items()}
     
-    # Graph header
-    lines.append(f"graph \"{layer_name}\" {{")
-    lines.append("")
-    lines.append("  graph [")
-    lines.append("    bgcolor=\"white\",")
-    lines.append(f"    label=\"{layer_name}\",")
-    lines.append(f"    labelloc=t,")
-    lines.append(f"    fontsize={font_size + 4},")
-    lines.append("    fontname=\"Sinkin Sans 400 Regular\",")
-    lines.append("    overlap=false,")
-    lines.append("    sep=0.5")
-    lines.append("  ];")
-    lines.append("")
+    buf = io.StringIO() if out is None else out
+    w = buf.write
     
-    lines.append("  node [")
-    lines.append("    shape=box,")
-    lines.append("    style=\"rounded,filled\",")
-    lines.append(f"    fontsize={font_size},")
-    lines.append("    fontname=\"Sinkin Sans 400 Regular\",")
-    lines.append("    margin=0.2")
-    lines.append("  ];")
-    lines.append("")
+    font_face = "\"Sinkin Sans 400 Regular\""
     
-    lines.append("  edge [")
-    lines.append(f"    color=\"{layer_edge_color}\",")
-    lines.append(f"    style={edge_style},")
-    lines.append(f"    penwidth={edge_width}")
-    lines.append("  ];")
-    lines.append("")
+    # Graph header
+    w(
+        f"graph \"{layer_name}\" {{\n"
+        "\n"
+        "  graph [\n"
+        "    bgcolor=\"white\",\n"
+        f"    label=\"{layer_name}\",\n"
+        "    labelloc=t,\n"
+        f"    fontsize={font_size + 4},\n"
+        f"    fontname={font_face},\n"
+        "    overlap=false,\n"
+        "    sep=0.5\n"
+        "  ];\n"
+        "\n"
+        "  node [\n"
+        "    shape=box,\n"
+        "    style=\"rounded,filled\",\n"
+        f"    fontsize={font_size},\n"
+        f"    fontname={font_face},\n"
+        "    margin=0.2\n"
+        "  ];\n"
+        "\n"
+        "  edge [\n"
+        f"    color=\"{layer_edge_color}\",\n"
+        f"    style={edge_style},\n"
+        f"    penwidth={edge_width}\n"
+        "  ];\n"
+        "\n"
+    )
     
     # Collect devices and connections per rack
     rack_devices = defaultdict(set)
-    rack_connection_count = defaultdict(lambda: defaultdict(int))  # Count connections per device per rack
+    rack_connection_count = Counter()  # Count connections per (rack, device)
     inter_rack_connections = []
+    rack_central = defaultdict(set)  # Central nodes per rack (any device with >1 connection)
     
     for conn in connections:
         from_dev = conn["from"]
@@ -76,22 +96,27 @@ def generate_wiring_diagram(layer, all_devices, type_colors):
         to_info = all_devices.get(to_dev)
         
         if from_info and to_info:
-            from_rack = from_info.get("rack_id")
-            to_rack = to_info.get("rack_id")
+            from_rack = from_info.rack_id
+            to_rack = to_info.rack_id
             
             # Track which devices belong to which rack
             rack_devices[from_rack].add(from_dev)
             rack_devices[to_rack].add(to_dev)
             
-            # Count connections
-            if from_rack == to_rack:
-                rack_connection_count[from_rack][from_dev] += 1
-                rack_connection_count[from_rack][to_dev] += 1
-            else:
+            if from_rack != to_rack:
                 # Inter-rack connection
                 inter_rack_connections.append((from_dev, to_dev, from_rack, to_rack))
-                rack_connection_count[from_rack][from_dev] += 1
-                rack_connection_count[to_rack][to_dev] += 1
+            
+            # Count connections, marking a device central as soon as it has a second one
+            from_key = (from_rack, from_dev)
+            rack_connection_count[from_key] += 1
+            if rack_connection_count[from_key] == 2:
+                rack_central[from_rack].add(from_dev)
+            
+            to_key = (to_rack, to_dev)
+            rack_connection_count[to_key] += 1
+            if rack_connection_count[to_key] == 2:
+                rack_central[to_rack].add(to_dev)
         else:
             # Log missing devices
             if not from_info:
@@ -99,127 +124,124 @@ def generate_wiring_diagram(layer, all_devices, type_colors):
             if not to_info:
                 print(f"Warning: Device '{to_dev}' not found in device map (used in {layer_name})")
     
-    # Find central nodes per rack (any device with >1 connection)
-    rack_central = defaultdict(list)
-    for rack_id in rack_devices:
-        for dev_name, conn_count in rack_connection_count[rack_id].items():
-            if conn_count > 1:
-                rack_central[rack_id].append(dev_name)
+    # Node ids are needed for every node and again for both ends of every
+    # edge, so work each one out once
+    node_ids = {dev_name: dev_name.translate(_NID_TABLE)
+                for devices in rack_devices.values() for dev_name in devices}
     
     # Create nodes grouped by rack and external groups
-    lines.append("  // Devices grouped by rack and external groups")
-    lines.append("")
+    w("  // Devices grouped by rack and external groups\n\n")
     
-    # Track external groups
-    external_groups = {}
-    for rack_id in sorted(rack_devices.keys()):
-        if rack_id == "external":
-            # Organize external devices by group
-            for dev_name in sorted(rack_devices[rack_id]):
-                dev_info = all_devices.get(dev_name)
-                group_name = dev_info.get("external_group", "External Devices")
-                
-                if group_name not in external_groups:
-                    external_groups[group_name] = set()
-                external_groups[group_name].add(dev_name)
+    # Track external groups, each listing its devices in sorted order
+    external_groups = defaultdict(list)
+    if "external" in rack_devices:
+        # Organize external devices by group
+        for dev_name in sorted(rack_devices["external"]):
+            external_groups[all_devices[dev_name].external_group].append(dev_name)
     
     # Create clusters for racks first
     for rack_id in sorted(rack_devices.keys()):
         if rack_id == "external":
             continue  # Handle external separately
         
-        devices = rack_devices[rack_id]
+        # Split the rack's devices, sorted once, into central and peripheral nodes
+        central_set = rack_central.get(rack_id, set())
+        devices = sorted(rack_devices[rack_id])
+        central_nodes = [dev_name for dev_name in devices if dev_name in central_set]
+        peripheral = [dev_name for dev_name in devices if dev_name not in central_set]
         
-        lines.append(f"  subgraph cluster_{rack_id} {{")
         rack_label = f"Rack {rack_id.replace('rack', '').replace('_front', '').replace('_rear', '').strip('_')}"
-        lines.append(f"    label=\"{rack_label}\";")
-        lines.append("    style=filled;")
-        lines.append("    color=\"#F5F5F5\";")
-        lines.append("    fontname=\"Sinkin Sans 400 Regular\";")
-        lines.append("")
+        w(
+            f"  subgraph cluster_{rack_id} {{\n"
+            f"    label=\"{rack_label}\";\n"
+            "    style=filled;\n"
+            "    color=\"#F5F5F5\";\n"
+            f"    fontname={font_face};\n"
+            "\n"
+        )
         
         # Central nodes - larger, prominent
-        central_nodes = rack_central.get(rack_id, [])
-        for dev_name in sorted(central_nodes):
-            node_id = dev_name.replace(" ", "_").replace("/", "_")
-            dev_info = all_devices.get(dev_name)
-            color = get_device_color(dev_info, type_colors)
-            connection_count = rack_connection_count[rack_id][dev_name]
+        for dev_name in central_nodes:
+            node_id = node_ids[dev_name]
+            color = device_colors[dev_name]
+            connection_count = rack_connection_count[(rack_id, dev_name)]
             
-            lines.append(f"    \"{node_id}\" [")
-            lines.append(f"      label=\"{dev_name}\\n({connection_count} conn)\",")
-            lines.append(f"      fillcolor=\"{color}\",")
-            lines.append("      penwidth=2.5")
-            lines.append("    ];")
+            w(
+                f"    \"{node_id}\" [\n"
+                f"      label=\"{dev_name}\\n({connection_count} conn)\",\n"
+                f"      fillcolor=\"{color}\",\n"
+                "      penwidth=2.5\n"
+                "    ];\n"
+            )
         
         # Peripheral nodes
-        peripheral = devices - set(central_nodes)
-        for dev_name in sorted(peripheral):
-            node_id = dev_name.replace(" ", "_").replace("/", "_")
-            dev_info = all_devices.get(dev_name)
-            color = get_device_color(dev_info, type_colors)
+        for dev_name in peripheral:
+            node_id = node_ids[dev_name]
+            color = device_colors[dev_name]
             
-            lines.append(f"    \"{node_id}\" [")
-            lines.append(f"      label=\"{dev_name}\",")
-            lines.append(f"      fillcolor=\"{color}\"")
-            lines.append("    ];")
+            w(
+                f"    \"{node_id}\" [\n"
+                f"      label=\"{dev_name}\",\n"
+                f"      fillcolor=\"{color}\"\n"
+                "    ];\n"
+            )
         
-        lines.append("  }")
-        lines.append("")
+        w("  }\n\n")
     
     # Create clusters for external device groups
+    central_set = rack_central.get("external", set())
     for group_name in sorted(external_groups.keys()):
+        # Group lists are already sorted, so split them in one pass
         devices = external_groups[group_name]
+        central_nodes = [dev_name for dev_name in devices if dev_name in central_set]
+        peripheral = [dev_name for dev_name in devices if dev_name not in central_set]
         
-        group_id = group_name.replace(" ", "_").replace("/", "_")
-        lines.append(f"  subgraph cluster_external_{group_id} {{")
-        lines.append(f"    label=\"{group_name}\";")
-        lines.append("    style=filled;")
-        lines.append("    color=\"#E0E0E0\";")
-        lines.append("    fontname=\"Sinkin Sans 400 Regular\";")
-        lines.append("")
+        group_id = group_name.translate(_NID_TABLE)
+        w(
+            f"  subgraph cluster_external_{group_id} {{\n"
+            f"    label=\"{group_name}\";\n"
+            "    style=filled;\n"
+            "    color=\"#E0E0E0\";\n"
+            f"    fontname={font_face};\n"
+            "\n"
+        )
         
         # Central nodes
-        central_nodes = rack_central.get("external", [])
-        for dev_name in sorted(devices):
-            if dev_name not in central_nodes:
-                continue
-            
-            node_id = dev_name.replace(" ", "_").replace("/", "_")
-            dev_info = all_devices.get(dev_name)
-            color = get_device_color(dev_info, type_colors)
-            connection_count = rack_connection_count["external"][dev_name]
+        for dev_name in central_nodes:
+            node_id = node_ids[dev_name]
+            color = device_colors[dev_name]
+            connection_count = rack_connection_count[("external", dev_name)]
             
-            lines.append(f"    \"{node_id}\" [")
-            lines.append(f"      label=\"{dev_name}\\n({connection_count} conn)\",")
-            lines.append(f"      fillcolor=\"{color}\",")
-            lines.append("      penwidth=2.5")
-            lines.append("    ];")
+            w(
+                f"    \"{node_id}\" [\n"
+                f"      label=\"{dev_name}\\n({connection_count} conn)\",\n"
+                f"      fillcolor=\"{color}\",\n"
+                "      penwidth=2.5\n"
+                "    ];\n"
+            )
         
         # Peripheral nodes
-        for dev_name in sorted(devices):
-            if dev_name in central_nodes:
-                continue
+        for dev_name in peripheral:
+            node_id = node_ids[dev_name]
+            color = device_colors[dev_name]
             
-            node_id = dev_name.replace(" ", "_").replace("/", "_")
-            dev_info = all_devices.get(dev_name)
-            color = get_device_color(dev_info, type_colors)
-            
-            lines.append(f"    \"{node_id}\" [")
-            lines.append(f"      label=\"{dev_name}\",")
-            lines.append(f"      fillcolor=\"{color}\"")
-            lines.append("    ];")
+            w(
+                f"    \"{node_id}\" [\n"
+                f"      label=\"{dev_name}\",\n"
+                f"      fillcolor=\"{color}\"\n"
+                "    ];\n"
+            )
         
-        lines.append("  }")
-        lines.append("")
+        w("  }\n\n")
     
     # Create connections
-    lines.append("  // Connections")
+    w("  // Connections\n")
     for conn in connections:
         from_dev = conn["from"]
         to_dev = conn["to"]
-        from_id = from_dev.replace(" ", "_").replace("/", "_")
-        to_id = to_dev.replace(" ", "_").replace("/", "_")
+        # Devices missing from the device map have no precomputed id
+        from_id = node_ids.get(from_dev) or from_dev.translate(_NID_TABLE)
+        to_id = node_ids.get(to_dev) or to_dev.translate(_NID_TABLE)
         
         label = conn.get("label", "")
         cable_type = conn.get("cable_type", "")
@@ -235,25 +257,18 @@ def generate_wiring_diagram(layer, all_devices, type_colors):
         conn_style = conn.get("style", edge_style)
         conn_width = conn.get("width", edge_width)
         
-        edge_attrs = [
-            f"color=\"{conn_edge_color}\"",
-            f"style={conn_style}",
-            f"penwidth={conn_width}"
-        ]
-        
+        # Label attributes are only added when there is a label
+        label_attrs = ""
         if label:
-            edge_attrs.append(f"label=\"{" "*3 + label}\"")
-            edge_attrs.append(f"fontsize={font_size - 3}")
-            edge_attrs.append("fontname=\"Sinkin Sans 400 Regular\"")
-        
-        # Format edge attributes properly (commas added by join)
-        edge_attrs_str = ", ".join(edge_attrs)
+            label_attrs = f", label=\"   {label}\", fontsize={font_size - 3}, fontname={font_face}"
         
-        lines.append(f"  {from_id} -- {to_id} [")
-        lines.append(f"    {edge_attrs_str}")
-        lines.append("  ];")
+        w(
+            f"  {from_id} -- {to_id} [\n"
+            f"    color=\"{conn_edge_color}\", style={conn_style}, penwidth={conn_width}{label_attrs}\n"
+            "  ];\n"
+        )
     
-    lines.append("")
-    lines.append("}")
+    w("\n}")
     
-    return "\n".join(lines)
+    if out is None:
+        return buf.getvalue()